@@ -0,0 +1,31 @@
+import numpy as np
+
+try:
+    from numba import prange
+except ImportError:
+    prange = range
+
+
+def normalize_batch(x, mean, std):
+    out = np.empty_like(x)
+    n, h, w, c = x.shape
+    for i in prange(n):
+        for j in range(h):
+            for k in range(w):
+                for l in range(c):
+                    out[i, j, k, l] = (x[i, j, k, l] - mean[l]) / std[l]
+    return out
+
+
+def get_extension():
+    """Returns the extension module `pyradox.pyradox_kernels`, with the kernels compiled ahead of
+    time by numba, to be built by setup.py
+    """
+    from numba.pycc import CC
+
+    cc = CC("pyradox_kernels")
+    cc.export(
+        "normalize_batch", "f4[:, :, :, ::1](f4[:, :, :, ::1], f4[::1], f4[::1])"
+    )(normalize_batch)
+    # the package is still usable (jit compiled kernels) if the extension fails to build
+    return cc.distutils_extension(optional=True)
@@ -1,6 +1,9 @@
-import math, copy
-from tensorflow.keras import layers
+import math, copy, functools
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import activations, layers
 from pyradox.modules import *
+from pyradox import export
 from tensorflow.keras.activations import swish
 from tensorflow.nn import relu6
 
@@ -17,9 +20,79 @@ def hard_swish(x):
     return layers.Multiply()([hard_sigmoid(x), x])
 
 
-class GeneralizedDenseNets(layers.Layer):
+def _stacked_initializer(identifier):
+    # initializes each slice along the first axis as a separate kernel, with a new
+    # (unseeded) initializer per slice so that the slices differ
+    def _initializer(shape, dtype=None, **kwargs):
+        return tf.stack(
+            [
+                tf.keras.initializers.get(identifier)(shape[1:], dtype=dtype)
+                for _ in range(shape[0])
+            ]
+        )
+
+    return _initializer
+
+
+class _Network(layers.Layer):
+    # shared base of GeneralizedDenseNets and GeneralizedVGG, the forward pass (`_forward`)
+    # can be compiled with XLA (`jit_compile`), one concrete function is traced per input
+    # shape, dtype and mode
+
+    @classmethod
+    def build_distributed(cls, *args, strategy=None, **kwargs):
+        """Creates the network with synchronized batch normalization within the scope of a
+        distribution strategy (default: MirroredStrategy over all the visible GPUs), the strategy
+        is available as `strategy`, the model should also be built and compiled within its scope,
+        and the learning rate scaled by `strategy.num_replicas_in_sync`
+        """
+        strategy = strategy or tf.distribute.MirroredStrategy()
+        with strategy.scope():
+            network = cls(*args, synchronized=True, **kwargs)
+        network.strategy = strategy
+        return network
+
+    def to_int8(self, representative_dataset, input_shape):
+        """Returns the network quantized to INT8 as a serialized TFLite model (bytes)
+
+        Args:
+            representative_dataset (callable): generator yielding lists of sample inputs
+            input_shape               (tuple): the input shape (without the batch dimension)
+        """
+        inputs = tf.keras.Input(shape=input_shape)
+        model = tf.keras.Model(inputs=inputs, outputs=self(inputs))
+        return export.to_int8(model, representative_dataset)
+
+    @tf.__internal__.tracking.no_automatic_dependency_tracking
+    def _clear_concrete_functions(self):
+        self._concrete = {}
+
+    def _get_concrete_function(self, inputs, training):
+        key = (tuple(inputs.shape[1:]), inputs.dtype, training)
+        if key not in self._concrete:
+            forward = tf.function(
+                functools.partial(self._forward, training=training), jit_compile=True
+            )
+            self._concrete[key] = forward.get_concrete_function(
+                tf.TensorSpec([None] + list(inputs.shape[1:]), inputs.dtype)
+            )
+        return self._concrete[key]
+
+    def call(self, inputs, training=None):
+        if self.jit_compile:
+            return self._get_concrete_function(inputs, bool(training))(inputs)
+        return self._forward(inputs, training=training)
+
+
+class GeneralizedDenseNets(_Network):
     """
     A generalization of Densely Connected Convolutional Networks (Dense Nets)
+
+    The stem convolution and max pooling use "same" padding, which pads asymmetrically on even
+    input sizes ((2, 3) around the convolution input, (0, 1) around the pooling input) instead
+    of the symmetric ZeroPadding2D (3, 3) and (1, 1) of earlier versions: the output shapes are
+    unchanged but the outputs are not, weights trained with the explicitly padded stem are not
+    equivalent
     Args:
         blocks          (list of int): numbers of layers for each dense block
         growth_rate:          (float): growth rate at convolution layers, default: 32
@@ -28,6 +101,18 @@ class GeneralizedDenseNets(layers.Layer):
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
         use_bias               (bool): whether the convolution (block) layers use a bias vector, default: False
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        efficient              (bool): use the memory efficient implementation of the dense blocks, which
+                    recomputes concatenations and intermediate activations during backpropagation, default: False
+        jit_compile            (bool): whether to compile the forward pass with XLA, which lets the
+                    concatenations of the dense blocks be fused instead of copied, default: False
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), can not be combined with jit_compile, default: False
+        einsum_bottleneck      (bool): compute the 1x1 bottleneck convolutions as einsums (GEMMs), default: False
+        grouped_kernels        (bool): store the 3x3 convolution kernels of each dense block in one contiguous
+                    variable of shape (layers, 3, 3, 4 * growth_rate, growth_rate), each kernel initialized
+                    with glorot_uniform as a Conv2D kernel, default: False
 
     """
 
@@ -39,6 +124,13 @@ class GeneralizedDenseNets(layers.Layer):
         epsilon=1.001e-5,
         activation="relu",
         use_bias=False,
+        fused=True,
+        data_format=None,
+        efficient=False,
+        jit_compile=False,
+        synchronized=False,
+        einsum_bottleneck=False,
+        grouped_kernels=False,
     ):
         super().__init__()
         self.blocks = blocks
@@ -47,23 +139,132 @@ class GeneralizedDenseNets(layers.Layer):
         self.epsilon = epsilon
         self.activation = activation
         self.use_bias = use_bias
+        self.fused = fused
+        self.data_format = data_format
+        self.efficient = efficient
+        self.jit_compile = jit_compile
+        if jit_compile and synchronized:
+            # the cross replica reduction of the batch statistics can not run within the
+            # XLA compiled forward pass
+            raise ValueError("jit_compile is not supported with synchronized")
+        self.synchronized = synchronized
+        self.einsum_bottleneck = einsum_bottleneck
+        self.grouped_kernels = grouped_kernels
+        self._clear_concrete_functions()
+
+        self.conv1 = layers.Conv2D(
+            64,
+            7,
+            strides=2,
+            padding="same",
+            use_bias=self.use_bias,
+            data_format=self.data_format,
+        )
+        channel_axis = get_channel_axis(self.data_format)
+        self.channel_axis = channel_axis
+        self.bn1 = get_batch_normalization(
+            axis=channel_axis,
+            epsilon=self.epsilon,
+            fused=self.fused,
+            synchronized=self.synchronized,
+        )
+        self.act1 = activations.get(self.activation)
+        self.pool1 = layers.MaxPooling2D(
+            3, strides=2, padding="same", data_format=self.data_format
+        )
 
-    def __call__(self, inputs):
-        x = inputs
-        x = layers.ZeroPadding2D(padding=((3, 3), (3, 3)))(x)
-        x = layers.Conv2D(64, 7, strides=2, use_bias=self.use_bias)(x)
-        x = layers.BatchNormalization(epsilon=self.epsilon)(x)
-        x = layers.Activation(self.activation)(x)
-        x = layers.ZeroPadding2D(padding=((1, 1), (1, 1)))(x)
-        x = layers.MaxPooling2D(3, strides=2)(x)
+        self.dense_blocks = []
+        self.transitions = []
+        for num_blocks in self.blocks:
+            self.dense_blocks.append(
+                [
+                    DenseNetConvolutionBlock(
+                        growth_rate=self.growth_rate,
+                        fused=self.fused,
+                        data_format=self.data_format,
+                        efficient=self.efficient,
+                        synchronized=self.synchronized,
+                        einsum_bottleneck=self.einsum_bottleneck,
+                        grouped_kernel=self.grouped_kernels,
+                    )
+                    for _ in range(num_blocks)
+                ]
+            )
+            self.transitions.append(
+                DenseNetTransitionBlock(
+                    reduction=self.reduction,
+                    fused=self.fused,
+                    data_format=self.data_format,
+                    synchronized=self.synchronized,
+                )
+            )
+
+        # kept in float32 under a mixed precision policy for numeric stability, the activation
+        # follows the float32 output
+        self.bn2 = get_batch_normalization(
+            axis=channel_axis,
+            epsilon=self.epsilon,
+            fused=self.fused,
+            synchronized=self.synchronized,
+            dtype="float32",
+        )
+        self.act2 = activations.get(self.activation)
+
+    def build(self, input_shape):
+        if self.grouped_kernels:
+            self.stage_kernels = [
+                self.add_weight(
+                    name="stage_kernels_%d" % i,
+                    shape=(num_blocks, 3, 3, 4 * self.growth_rate, self.growth_rate),
+                    initializer=_stacked_initializer("glorot_uniform"),
+                )
+                for i, num_blocks in enumerate(self.blocks)
+            ]
+        super().build(input_shape)
 
-        for i in range(len(self.blocks)):
-            for _ in range(self.blocks[i]):
-                x = DenseNetConvolutionBlock(growth_rate=self.growth_rate)(x)
-            x = DenseNetTransitionBlock(reduction=self.reduction)(x)
+    def freeze_for_inference(self, sample_input):
+        """Folds the batch normalizations that follow a convolution (the stem and the bottlenecks
+        of the convolution blocks) into the convolution weights, the network can only be used
+        for inference afterwards, returns the network
 
-        x = layers.BatchNormalization(epsilon=self.epsilon)(x)
-        x = layers.Activation(self.activation)(x)
+        Args:
+            sample_input (tensor): sample input batch, used to build the network
+        """
+        self(sample_input)
+        self.conv1 = fold_batch_normalization(self.conv1, self.bn1)
+        self.bn1 = None
+        for dense_block in self.dense_blocks:
+            for block in dense_block:
+                block.freeze_for_inference()
+        self._clear_concrete_functions()
+        return self
+
+    def _forward(self, inputs, training=None):
+        x = inputs
+        x = self.conv1(x)
+        if self.bn1 is not None:
+            x = self.bn1(x, training=training)
+        x = self.act1(x)
+        x = self.pool1(x)
+
+        for i, (dense_block, transition) in enumerate(
+            zip(self.dense_blocks, self.transitions)
+        ):
+            kernels = [None] * len(dense_block)
+            if self.grouped_kernels:
+                kernels = tf.unstack(self.stage_kernels[i])
+            if self.efficient:
+                features = [x]
+                for block, kernel in zip(dense_block, kernels):
+                    features.append(block(features, training=training, kernel=kernel))
+                x = tf.concat(features, axis=self.channel_axis)
+            else:
+                for block, kernel in zip(dense_block, kernels):
+                    x = block(x, training=training, kernel=kernel)
+            x = transition(x, training=training)
+
+        x = self.bn2(x, training=training)
+        x = self.act2(x)
         return x
 
 
@@ -76,6 +277,18 @@ class DenselyConnectedConvolutionalNetwork121(GeneralizedDenseNets):
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
         use_bias               (bool): whether the convolution (block) layers use a bias vector, default: False
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        efficient              (bool): use the memory efficient implementation of the dense blocks, which
+                    recomputes concatenations and intermediate activations during backpropagation, default: False
+        jit_compile            (bool): whether to compile the forward pass with XLA, which lets the
+                    concatenations of the dense blocks be fused instead of copied, default: False
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), can not be combined with jit_compile, default: False
+        einsum_bottleneck      (bool): compute the 1x1 bottleneck convolutions as einsums (GEMMs), default: False
+        grouped_kernels        (bool): store the 3x3 convolution kernels of each dense block in one contiguous
+                    variable of shape (layers, 3, 3, 4 * growth_rate, growth_rate), each kernel initialized
+                    with glorot_uniform as a Conv2D kernel, default: False
     """
 
     def __init__(
@@ -85,9 +298,28 @@ class DenselyConnectedConvolutionalNetwork121(GeneralizedDenseNets):
         epsilon=1.001e-5,
         activation="relu",
         use_bias=False,
+        fused=True,
+        data_format=None,
+        efficient=False,
+        jit_compile=False,
+        synchronized=False,
+        einsum_bottleneck=False,
+        grouped_kernels=False,
     ):
         super().__init__(
-            [6, 12, 24, 16], growth_rate, reduction, epsilon, activation, use_bias
+            [6, 12, 24, 16],
+            growth_rate,
+            reduction,
+            epsilon,
+            activation,
+            use_bias,
+            fused,
+            data_format,
+            efficient,
+            jit_compile,
+            synchronized,
+            einsum_bottleneck,
+            grouped_kernels,
         )
 
 
@@ -100,6 +332,18 @@ class DenselyConnectedConvolutionalNetwork169(GeneralizedDenseNets):
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
         use_bias               (bool): whether the convolution (block) layers use a bias vector, default: False
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        efficient              (bool): use the memory efficient implementation of the dense blocks, which
+                    recomputes concatenations and intermediate activations during backpropagation, default: False
+        jit_compile            (bool): whether to compile the forward pass with XLA, which lets the
+                    concatenations of the dense blocks be fused instead of copied, default: False
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), can not be combined with jit_compile, default: False
+        einsum_bottleneck      (bool): compute the 1x1 bottleneck convolutions as einsums (GEMMs), default: False
+        grouped_kernels        (bool): store the 3x3 convolution kernels of each dense block in one contiguous
+                    variable of shape (layers, 3, 3, 4 * growth_rate, growth_rate), each kernel initialized
+                    with glorot_uniform as a Conv2D kernel, default: False
     """
 
     def __init__(
@@ -109,9 +353,28 @@ class DenselyConnectedConvolutionalNetwork169(GeneralizedDenseNets):
         epsilon=1.001e-5,
         activation="relu",
         use_bias=False,
+        fused=True,
+        data_format=None,
+        efficient=False,
+        jit_compile=False,
+        synchronized=False,
+        einsum_bottleneck=False,
+        grouped_kernels=False,
     ):
         super().__init__(
-            [6, 12, 32, 32], growth_rate, reduction, epsilon, activation, use_bias
+            [6, 12, 32, 32],
+            growth_rate,
+            reduction,
+            epsilon,
+            activation,
+            use_bias,
+            fused,
+            data_format,
+            efficient,
+            jit_compile,
+            synchronized,
+            einsum_bottleneck,
+            grouped_kernels,
         )
 
 
@@ -124,6 +387,18 @@ class DenselyConnectedConvolutionalNetwork201(GeneralizedDenseNets):
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
         use_bias               (bool): whether the convolution (block) layers use a bias vector, default: False
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        efficient              (bool): use the memory efficient implementation of the dense blocks, which
+                    recomputes concatenations and intermediate activations during backpropagation, default: False
+        jit_compile            (bool): whether to compile the forward pass with XLA, which lets the
+                    concatenations of the dense blocks be fused instead of copied, default: False
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), can not be combined with jit_compile, default: False
+        einsum_bottleneck      (bool): compute the 1x1 bottleneck convolutions as einsums (GEMMs), default: False
+        grouped_kernels        (bool): store the 3x3 convolution kernels of each dense block in one contiguous
+                    variable of shape (layers, 3, 3, 4 * growth_rate, growth_rate), each kernel initialized
+                    with glorot_uniform as a Conv2D kernel, default: False
     """
 
     def __init__(
@@ -133,13 +408,32 @@ class DenselyConnectedConvolutionalNetwork201(GeneralizedDenseNets):
         epsilon=1.001e-5,
         activation="relu",
         use_bias=False,
+        fused=True,
+        data_format=None,
+        efficient=False,
+        jit_compile=False,
+        synchronized=False,
+        einsum_bottleneck=False,
+        grouped_kernels=False,
     ):
         super().__init__(
-            [6, 12, 48, 32], growth_rate, reduction, epsilon, activation, use_bias
+            [6, 12, 48, 32],
+            growth_rate,
+            reduction,
+            epsilon,
+            activation,
+            use_bias,
+            fused,
+            data_format,
+            efficient,
+            jit_compile,
+            synchronized,
+            einsum_bottleneck,
+            grouped_kernels,
         )
 
 
-class GeneralizedVGG(layers.Layer):
+class GeneralizedVGG(_Network):
     """
     A generalization of VGG networks
 
@@ -152,6 +446,10 @@ class GeneralizedVGG(layers.Layer):
         dense_batch_norm  (bool): whether to use Batch Normalization in dense layers, default: False
         dense_dropout     (float): the dropout rate in dense layers, default: 0
         dense_activation  (keras Activation): activation function for dense Layers, default: relu
+        jit_compile       (bool): whether to compile the forward pass with XLA, under which the flatten
+                becomes a free reshape (bitcast) ahead of the densely connected layers, default: False
+        synchronized      (bool): whether to synchronize the Batch Normalization statistics across replicas,
+                can not be combined with jit_compile, default: False
         kwargs              (keyword arguments):
     """
 
@@ -165,38 +463,65 @@ class GeneralizedVGG(layers.Layer):
         dense_batch_norm=False,
         dense_dropout=0,
         dense_activation="relu",
+        jit_compile=False,
+        synchronized=False,
         **kwargs,
     ):
         super().__init__()
         self.conv_config = conv_config
         self.dense_config = dense_config
+        # the convolution config stored as parallel arrays
+        self.num_conv = np.array([c for c, _ in conv_config], dtype=np.int32)
+        self.num_filters = np.array([f for _, f in conv_config], dtype=np.int32)
         self.conv_batch_norm = conv_batch_norm
         self.conv_dropout = conv_dropout
         self.conv_activation = conv_activation
         self.dense_batch_norm = dense_batch_norm
         self.dense_dropout = dense_dropout
         self.dense_activation = dense_activation
+        self.jit_compile = jit_compile
+        if jit_compile and synchronized:
+            # the cross replica reduction of the batch statistics can not run within the
+            # XLA compiled forward pass
+            raise ValueError("jit_compile is not supported with synchronized")
+        self.synchronized = synchronized
         self.kwargs = kwargs
+        self._clear_concrete_functions()
 
-    def __call__(self, inputs):
-        x = inputs
-        for num_conv, num_filters in self.conv_config:
-            x = VGGModule(
+        self.vgg_modules = [
+            VGGModule(
                 num_conv=num_conv,
                 num_filters=num_filters,
                 batch_normalization=self.conv_batch_norm,
                 dropout=self.conv_dropout,
+                synchronized=self.synchronized,
                 activation=self.conv_activation,
-            )(x)
+            )
+            for num_conv, num_filters in zip(
+                self.num_conv.tolist(), self.num_filters.tolist()
+            )
+        ]
         if len(self.dense_config) > 0:
-            x = layers.Flatten()(x)
-        for num_units in self.dense_config:
-            x = DenselyConnected(
+            self.flatten = layers.Flatten()
+        self.dense_layers = [
+            DenselyConnected(
                 units=num_units,
                 batch_normalization=self.dense_batch_norm,
                 dropout=self.dense_dropout,
+                synchronized=self.synchronized,
                 activation=self.dense_activation,
-            )(x)
+            )
+            for num_units in self.dense_config
+        ]
+
+    def _forward(self, inputs, training=None):
+        x = inputs
+        for vgg_module in self.vgg_modules:
+            x = vgg_module(x, training=training)
+        if len(self.dense_config) > 0:
+            x = self.flatten(x)
+        for dense_layer in self.dense_layers:
+            x = dense_layer(x, training=training)
         return x
 
 
@@ -212,6 +537,10 @@ class VGG16(GeneralizedVGG):
         dense_batch_norm  (bool): whether to use Batch Normalization in dense layers (if use_dense = True), default: False
         dense_dropout     (float): the dropout rate in dense layers (if use_dense = True), default: 0
         dense_activation  (keras Activation): activation function for dense Layers (if use_dense = True), default: relu
+        jit_compile       (bool): whether to compile the forward pass with XLA, under which the flatten
+                becomes a free reshape (bitcast) ahead of the densely connected layers, default: False
+        synchronized      (bool): whether to synchronize the Batch Normalization statistics across replicas,
+                can not be combined with jit_compile, default: False
         kwargs            (keyword arguments):
     """
 
@@ -224,6 +553,8 @@ class VGG16(GeneralizedVGG):
         dense_batch_norm=False,
         dense_dropout=0,
         dense_activation="relu",
+        jit_compile=False,
+        synchronized=False,
         **kwargs,
     ):
         conv_config = [
@@ -243,6 +574,8 @@ class VGG16(GeneralizedVGG):
             dense_batch_norm,
             dense_dropout,
             dense_activation,
+            jit_compile,
+            synchronized,
             **kwargs,
         )
 
@@ -259,6 +592,10 @@ class VGG19(GeneralizedVGG):
         dense_batch_norm  (bool): whether to use Batch Normalization in dense layers (if use_dense = True), default: False
         dense_dropout     (float): the dropout rate in dense layers (if use_dense = True), default: 0
         dense_activation  (keras Activation): activation function for dense Layers (if use_dense = True), default: relu
+        jit_compile       (bool): whether to compile the forward pass with XLA, under which the flatten
+                becomes a free reshape (bitcast) ahead of the densely connected layers, default: False
+        synchronized      (bool): whether to synchronize the Batch Normalization statistics across replicas,
+                can not be combined with jit_compile, default: False
         kwargs            (keyword arguments):
     """
 
@@ -271,6 +608,8 @@ class VGG19(GeneralizedVGG):
         dense_batch_norm=False,
         dense_dropout=0,
         dense_activation="relu",
+        jit_compile=False,
+        synchronized=False,
         **kwargs,
     ):
         conv_config = [
@@ -290,6 +629,8 @@ class VGG19(GeneralizedVGG):
             dense_batch_norm,
             dense_dropout,
             dense_activation,
+            jit_compile,
+            synchronized,
             **kwargs,
         )
 
@@ -1410,7 +1751,7 @@ class EfficientNet(layers.Layer):
         blocks = float(
             sum(self._round_repeats(args["repeats"]) for args in blocks_args)
         )
-        for (i, args) in enumerate(blocks_args):
+        for i, args in enumerate(blocks_args):
             assert args["repeats"] > 0
             # Update block input and output filters based on depth multiplier.
             args["filters_in"] = self._round_filters(args["filters_in"])
@@ -2184,7 +2525,7 @@ class NASNet(layers.Layer):
         self.activation = activation
         self.use_bias = use_bias
 
-        if penultimate_filters % (24 * (filter_multiplier ** 2)) != 0:
+        if penultimate_filters % (24 * (filter_multiplier**2)) != 0:
             raise ValueError(
                 f"For NASNet-A models, the `penultimate_filters` must be a multiple "
                 "of 24 * (`filter_multiplier` ** 2). Current value: {penultimate_filters}"
@@ -2206,7 +2547,7 @@ class NASNet(layers.Layer):
 
         p = None
         x, p = NASNetReductionACell(
-            filters // (self.filter_multiplier ** 2),
+            filters // (self.filter_multiplier**2),
             self.momentum,
             self.epsilon,
             self.activation,
@@ -2249,7 +2590,7 @@ class NASNet(layers.Layer):
             )(x, p)
 
         x, p0 = NASNetReductionACell(
-            filters * self.filter_multiplier ** 2,
+            filters * self.filter_multiplier**2,
             self.momentum,
             self.epsilon,
             self.activation,
@@ -2260,7 +2601,7 @@ class NASNet(layers.Layer):
 
         for _ in range(self.num_blocks):
             x, p = NASNetNormalACell(
-                filters * self.filter_multiplier ** 2,
+                filters * self.filter_multiplier**2,
                 self.momentum,
                 self.epsilon,
                 self.activation,
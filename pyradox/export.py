@@ -0,0 +1,102 @@
+import os
+import tempfile
+import tensorflow as tf
+from tensorflow.python.framework.convert_to_constants import (
+    convert_variables_to_constants_v2,
+)
+from tensorflow.python.tools import optimize_for_inference_lib
+
+
+def to_int8(model, representative_dataset):
+    """Converts a keras model to a TFLite flatbuffer with full integer (INT8) post training
+    quantization of the weights and activations, returns the serialized model (bytes)
+
+    Args:
+        model                    (keras Model): the model to be converted
+        representative_dataset      (callable): generator yielding lists of sample inputs used to
+                    calibrate the activation ranges, e.g. `lambda: ([x[None]] for x in samples)`
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def to_trt(model, sample_input, output_dir, precision_mode="FP16"):
+    """Converts a keras model with TF-TRT and saves it as a SavedModel in `output_dir`, the
+    TensorRT engines are built for the shape of `sample_input` ahead of time so that the forward
+    pass runs as a few engine launches (requires a TensorFlow build with TensorRT), returns
+    `output_dir`
+
+    Args:
+        model        (keras Model): the model to be converted
+        sample_input     (tensor): sample input batch, with the shape used for inference
+        output_dir          (str): the directory of the converted SavedModel
+        precision_mode      (str): "FP32", "FP16" or "INT8", default: FP16
+    """
+
+    def input_fn():
+        yield (sample_input,)
+
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        tf.saved_model.save(model, saved_model_dir)
+        converter = tf.experimental.tensorrt.Converter(
+            input_saved_model_dir=saved_model_dir, precision_mode=precision_mode
+        )
+        # INT8 engines are calibrated on the sample input
+        if precision_mode.upper() == "INT8":
+            converter.convert(calibration_input_fn=input_fn)
+        else:
+            converter.convert()
+        converter.build(input_fn=input_fn)
+        converter.save(output_dir)
+    return output_dir
+
+
+def freeze(model, path):
+    """Freezes a keras model for inference and writes the graph to `path` (binary GraphDef), the
+    variables are converted to constants and the batch normalizations following convolutions are
+    folded into their weights (not within networks compiled with `jit_compile`, which stay a call
+    of the frozen XLA function), returns the optimized GraphDef
+
+    Args:
+        model (keras Model): the model to be frozen
+        path          (str): the path of the written graph, e.g. `frozen/model.pb`
+    """
+    inputs = model.inputs[0]
+    forward = tf.function(lambda x: model(x, training=False))
+    concrete_function = forward.get_concrete_function(
+        tf.TensorSpec(inputs.shape, inputs.dtype)
+    )
+    frozen_function = convert_variables_to_constants_v2(concrete_function)
+    graph_def = frozen_function.graph.as_graph_def()
+    # the control dependencies on the former variable reads (now identities of constants) would
+    # keep them from being folded, the other control dependencies are kept
+    nodes = {node.name: node for node in graph_def.node}
+
+    def _is_constant_read(name):
+        node = nodes.get(name[1:])
+        return (
+            node is not None
+            and node.op in ("Identity", "ReadVariableOp")
+            and len(node.input) > 0
+            and nodes.get(node.input[0].split(":")[0], node).op == "Const"
+        )
+
+    for node in graph_def.node:
+        node.input[:] = [
+            name
+            for name in node.input
+            if not (name.startswith("^") and _is_constant_read(name))
+        ]
+    graph_def = optimize_for_inference_lib.optimize_for_inference(
+        graph_def,
+        [tensor.op.name for tensor in frozen_function.inputs],
+        [tensor.op.name for tensor in frozen_function.outputs],
+        [tensor.dtype.as_datatype_enum for tensor in frozen_function.inputs],
+    )
+    tf.io.write_graph(
+        graph_def, os.path.dirname(path) or ".", os.path.basename(path), as_text=False
+    )
+    return graph_def
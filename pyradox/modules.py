@@ -1,4 +1,7 @@
-from tensorflow.keras import layers
+import inspect
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import activations, backend, layers
 from tensorflow.keras.activations import swish
 from tensorflow.nn import relu6
 
@@ -15,6 +18,65 @@ def hard_swish(x):
     return layers.Multiply()([hard_sigmoid(x), x])
 
 
+def get_channel_axis(data_format=None):
+    if data_format is None:
+        data_format = backend.image_data_format()
+    return -1 if data_format == "channels_last" else 1
+
+
+# Keras 3 (tf.keras from TensorFlow 2.16) dropped the `fused` argument of BatchNormalization
+_SUPPORTS_FUSED = any(
+    "fused" in inspect.signature(base.__init__).parameters
+    for base in layers.BatchNormalization.__mro__
+)
+
+
+def get_batch_normalization(fused=None, synchronized=False, **kwargs):
+    if synchronized:
+        # synchronized batch normalization has no fused kernel
+        return layers.BatchNormalization(synchronized=True, **kwargs)
+    if _SUPPORTS_FUSED:
+        kwargs["fused"] = fused
+    return layers.BatchNormalization(**kwargs)
+
+
+def fold_batch_normalization(layer, batch_norm):
+    """Folds a batch normalization into the preceding convolution for inference, returns a new
+    layer (with a bias) equivalent to `batch_norm(layer(x), training=False)`
+
+    Args:
+        layer          (keras Layer): built Conv2D or EinsumDense layer, the last axis of its kernel
+                    indexes the output channels
+        batch_norm (keras BatchNormalization): built batch normalization applied on the output of layer
+    """
+    weights = layer.get_weights()
+    kernel = weights[0]
+    bias = weights[1] if len(weights) > 1 else np.zeros(kernel.shape[-1], kernel.dtype)
+    scale = 1.0 / np.sqrt(batch_norm.moving_variance.numpy() + batch_norm.epsilon)
+    if batch_norm.scale:
+        scale = scale * batch_norm.gamma.numpy()
+    offset = batch_norm.beta.numpy() if batch_norm.center else 0.0
+    kernel = kernel * scale
+    bias = (bias - batch_norm.moving_mean.numpy()) * scale + offset
+
+    config = layer.get_config()
+    if isinstance(layer, layers.EinsumDense):
+        # the output channels are indexed by the last axis of the kernel
+        config["bias_axes"] = config["equation"].split("->")[0].split(",")[-1][-1]
+        channels_last = config["equation"].startswith("...")
+    else:
+        config["use_bias"] = True
+        channels_last = config["data_format"] == "channels_last"
+    input_channels = kernel.shape[0] if kernel.ndim == 2 else kernel.shape[-2]
+    folded = layer.__class__.from_config(config)
+    if channels_last:
+        folded.build((None, None, None, input_channels))
+    else:
+        folded.build((None, input_channels, None, None))
+    folded.set_weights([kernel, np.reshape(bias, folded.bias.shape)])
+    return folded
+
+
 class Convolution2D(layers.Layer):
     """Applies 2D Convolution followed by Batch Normalization (optional) and Dropout (optional)
 
@@ -24,6 +86,9 @@ class Convolution2D(layers.Layer):
                 single integer specifies the same value for both dimensions, default: 3
         batch_normalization (bool): whether to use Batch Normalization, default: False
         dropout             (float): the dropout rate, default: 0
+        fused               (bool): whether to use the fused Batch Normalization kernel, default: True
+        synchronized        (bool): whether to synchronize the Batch Normalization statistics across replicas
+                (not fused), default: False
         kwargs              (keyword arguments): the arguments for Convolution Layer
     """
 
@@ -33,6 +98,8 @@ class Convolution2D(layers.Layer):
         kernel_size=3,
         batch_normalization=False,
         dropout=0,
+        fused=True,
+        synchronized=False,
         **kwargs
     ):
         super().__init__()
@@ -40,15 +107,29 @@ class Convolution2D(layers.Layer):
         self.kernel_size = kernel_size
         self.batch_normalization = batch_normalization
         self.dropout = dropout
+        self.fused = fused
+        self.synchronized = synchronized
         self.kwargs = kwargs
 
-    def __call__(self, inputs):
+    def build(self, input_shape):
+        self.conv = layers.Conv2D(self.num_filters, self.kernel_size, **self.kwargs)
+        if self.batch_normalization:
+            self.batch_norm = get_batch_normalization(
+                axis=get_channel_axis(),
+                fused=self.fused,
+                synchronized=self.synchronized,
+            )
+        if self.dropout != 0:
+            self.dropout_layer = layers.Dropout(self.dropout)
+        super().build(input_shape)
+
+    def call(self, inputs):
         x = inputs
-        x = layers.Conv2D(self.num_filters, self.kernel_size, **self.kwargs)(x)
+        x = self.conv(x)
         if self.batch_normalization:
-            x = layers.BatchNormalization()(x)
+            x = self.batch_norm(x)
         if self.dropout != 0:
-            x = layers.Dropout(self.dropout)(x)
+            x = self.dropout_layer(x)
         return x
 
 
@@ -59,26 +140,52 @@ class DenselyConnected(layers.Layer):
         units                (int): dimensionality of the output space
         batch_normalization (bool): whether to use Batch Normalization, default: False
         dropout            (float): the dropout rate, default: 0
+        synchronized        (bool): whether to synchronize the Batch Normalization statistics across replicas,
+                default: False
         kwargs (keyword arguments): the arguments for Dense Layer
     """
 
-    def __init__(self, units, batch_normalization=False, dropout=0, **kwargs):
+    def __init__(
+        self, units, batch_normalization=False, dropout=0, synchronized=False, **kwargs
+    ):
         super().__init__()
         self.units = units
         self.batch_normalization = batch_normalization
         self.dropout = dropout
+        self.synchronized = synchronized
         self.kwargs = kwargs
 
-    def __call__(self, inputs):
+    def build(self, input_shape):
+        self.dense = layers.Dense(self.units, **self.kwargs)
+        if self.batch_normalization:
+            self.batch_norm = get_batch_normalization(synchronized=self.synchronized)
+        if self.dropout != 0:
+            self.dropout_layer = layers.Dropout(self.dropout)
+        super().build(input_shape)
+
+    def call(self, inputs):
         x = inputs
-        x = layers.Dense(self.units, **self.kwargs)(x)
+        x = self.dense(x)
         if self.batch_normalization:
-            x = layers.BatchNormalization()(x)
+            x = self.batch_norm(x)
         if self.dropout != 0:
-            x = layers.Dropout(self.dropout)(x)
+            x = self.dropout_layer(x)
         return x
 
 
+# the convolution arguments that also apply to the einsum bottleneck
+_EINSUM_DENSE_KWARGS = (
+    "activation",
+    "kernel_initializer",
+    "bias_initializer",
+    "kernel_regularizer",
+    "bias_regularizer",
+    "activity_regularizer",
+    "kernel_constraint",
+    "bias_constraint",
+)
+
+
 class DenseNetConvolutionBlock(layers.Layer):
     """A Convolution block for DenseNets
 
@@ -88,32 +195,207 @@ class DenseNetConvolutionBlock(layers.Layer):
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
         use_bias               (bool): whether the convolution layers use a bias vector, defalut: False
-        kwargs    (keyword arguments): the arguments for Convolution Layer
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        efficient              (bool): memory efficient implementation, the block takes the list of preceding
+                    feature maps and returns only the new feature map, the concatenation and intermediate
+                    activations are recomputed during backpropagation, default: False
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), default: False
+        einsum_bottleneck      (bool): compute the 1x1 bottleneck convolution as an einsum, which runs as a
+                    single matrix multiplication (GEMM) over the channels, default: False
+        grouped_kernel         (bool): the kernel of the 3x3 convolution (without bias) is owned by the caller
+                    and passed as the `kernel` argument of the call, can not be combined with use_bias or
+                    kwargs, default: False
+        kwargs    (keyword arguments): the arguments for Convolution Layer, with einsum_bottleneck only the
+                    activation, initializer, regularizer and constraint arguments apply to the bottleneck
     """
 
     def __init__(
-        self, growth_rate, epsilon=1.001e-5, activation="relu", use_bias=False, **kwargs
+        self,
+        growth_rate,
+        epsilon=1.001e-5,
+        activation="relu",
+        use_bias=False,
+        fused=True,
+        data_format=None,
+        efficient=False,
+        synchronized=False,
+        einsum_bottleneck=False,
+        grouped_kernel=False,
+        **kwargs
     ):
         super().__init__()
         self.growth_rate = growth_rate
         self.epsilon = epsilon
         self.activation = activation
         self.use_bias = use_bias
+        self.fused = fused
+        self.data_format = data_format
+        self.efficient = efficient
+        self.synchronized = synchronized
+        self.einsum_bottleneck = einsum_bottleneck
+        if einsum_bottleneck:
+            # padding and dilation are no-ops for a 1x1 convolution, strides and groups are not
+            for key in ("strides", "groups"):
+                if kwargs.get(key, 1) not in (1, (1, 1), [1, 1]):
+                    raise ValueError(
+                        "%s=%r is not supported with einsum_bottleneck"
+                        % (key, kwargs[key])
+                    )
+        if grouped_kernel and (use_bias or kwargs):
+            # the 3x3 convolution has no layer of its own to apply them to
+            raise ValueError(
+                "use_bias and the convolution arguments are not supported with grouped_kernel"
+            )
+        self.grouped_kernel = grouped_kernel
         self.kwargs = kwargs
 
-    def __call__(self, inputs):
+    def build(self, input_shape):
+        channel_axis = get_channel_axis(self.data_format)
+        self.channel_axis = channel_axis
+        self.bn1 = get_batch_normalization(
+            axis=channel_axis,
+            epsilon=self.epsilon,
+            fused=self.fused,
+            synchronized=self.synchronized,
+        )
+        self.act1 = activations.get(self.activation)
+        if self.einsum_bottleneck:
+            filters = 4 * self.growth_rate
+            if channel_axis == -1:
+                equation, output_shape = "...c,cf->...f", filters
+            else:
+                equation, output_shape = "nchw,cf->nfhw", (filters, None, None)
+            self.conv1 = layers.EinsumDense(
+                equation,
+                output_shape,
+                bias_axes="f" if self.use_bias else None,
+                **{
+                    key: value
+                    for key, value in self.kwargs.items()
+                    if key in _EINSUM_DENSE_KWARGS
+                }
+            )
+        else:
+            self.conv1 = layers.Conv2D(
+                4 * self.growth_rate,
+                1,
+                use_bias=self.use_bias,
+                data_format=self.data_format,
+                **self.kwargs
+            )
+        self.bn2 = get_batch_normalization(
+            axis=channel_axis,
+            epsilon=self.epsilon,
+            fused=self.fused,
+            synchronized=self.synchronized,
+        )
+        self.act2 = activations.get(self.activation)
+        if not self.grouped_kernel:
+            self.conv2 = layers.Conv2D(
+                self.growth_rate,
+                3,
+                padding="same",
+                use_bias=self.use_bias,
+                data_format=self.data_format,
+                **self.kwargs
+            )
+        self.concat = layers.Concatenate(axis=channel_axis)
+        super().build(input_shape)
+
+    def freeze_for_inference(self):
+        """Folds the second batch normalization into the bottleneck convolution, the block can
+        only be used for inference afterwards
+        """
+        self.conv1 = fold_batch_normalization(self.conv1, self.bn2)
+        self.bn2 = None
+
+    def _normalize(self, batch_norm, x, training=None, moments=None):
+        if moments is None or not batch_norm.trainable:
+            return batch_norm(x, training=training)
+        # normalizes with the batch statistics like batch_norm(x, training=True), the statistics
+        # are appended to moments instead of updating the moving statistics
+        batch_norm._maybe_build(x)
+        dtype = x.dtype
+        x = tf.cast(x, batch_norm.gamma.dtype)
+        axes = [axis for axis in range(x.shape.rank) if axis not in batch_norm.axis]
+        mean, variance = batch_norm._moments(x, axes, keep_dims=True)
+        x = tf.nn.batch_normalization(
+            x,
+            mean,
+            variance,
+            tf.reshape(batch_norm.beta, mean.shape),
+            tf.reshape(batch_norm.gamma, mean.shape),
+            batch_norm.epsilon,
+        )
+        if batch_norm.fused:
+            # the fused kernel updates the moving variance with the unbiased batch variance
+            sample_size = tf.cast(tf.size(x) // tf.size(mean), variance.dtype)
+            variance = variance * sample_size / (sample_size - 1.0)
+        moments.extend([tf.reshape(mean, [-1]), tf.reshape(variance, [-1])])
+        return tf.cast(x, dtype)
+
+    def _dense_layer(self, x, training=None, kernel=None, moments=None):
+        x = self._normalize(self.bn1, x, training=training, moments=moments)
+        x = self.act1(x)
+        x = self.conv1(x)
+        if self.bn2 is not None:
+            x = self._normalize(self.bn2, x, training=training, moments=moments)
+        x = self.act2(x)
+        if self.grouped_kernel:
+            data_format = "NHWC" if self.channel_axis == -1 else "NCHW"
+            x = tf.nn.conv2d(x, kernel, 1, "SAME", data_format=data_format)
+        else:
+            x = self.conv2(x)
+        return x
+
+    def call(self, inputs, training=None, kernel=None):
+        if training is None:
+            training = backend.learning_phase()
+        if self.efficient and not training:
+            # nothing to recompute at inference, this also keeps the gradient identities of
+            # recompute_grad out of exported inference graphs
+            x = tf.concat(inputs, axis=self.channel_axis)
+            return self._dense_layer(x, training=training, kernel=kernel)
+
+        if self.efficient:
+
+            def _efficient_dense_layer(*features):
+                kernel = None
+                if self.grouped_kernel:
+                    # the kernel is the last input, so that it gets a gradient
+                    *features, kernel = features
+                x = tf.concat(features, axis=self.channel_axis)
+                moments = []
+                x = self._dense_layer(x, training=True, kernel=kernel, moments=moments)
+                return [x] + moments
+
+            if self.grouped_kernel:
+                inputs = list(inputs) + [kernel]
+            x, *moments = tf.recompute_grad(_efficient_dense_layer)(*inputs)
+            # the function runs again during backpropagation, so the moving statistics are
+            # updated once here instead of by the batch normalizations
+            batch_norms = [
+                batch_norm
+                for batch_norm in (self.bn1, self.bn2)
+                if batch_norm is not None and batch_norm.trainable
+            ]
+            for batch_norm, mean, variance in zip(
+                batch_norms, moments[::2], moments[1::2]
+            ):
+                decay = 1.0 - batch_norm.momentum
+                batch_norm.moving_mean.assign_sub(
+                    (batch_norm.moving_mean - mean) * decay
+                )
+                batch_norm.moving_variance.assign_sub(
+                    (batch_norm.moving_variance - variance) * decay
+                )
+            return x
+
         x = inputs
-        x1 = layers.BatchNormalization(epsilon=self.epsilon)(x)
-        x1 = layers.Activation(self.activation)(x1)
-        x1 = layers.Conv2D(
-            4 * self.growth_rate, 1, use_bias=self.use_bias, **self.kwargs
-        )(x1)
-        x1 = layers.BatchNormalization(epsilon=self.epsilon)(x1)
-        x1 = layers.Activation(self.activation)(x1)
-        x1 = layers.Conv2D(
-            self.growth_rate, 3, padding="same", use_bias=self.use_bias, **self.kwargs
-        )(x1)
-        x = layers.Concatenate(axis=3)([x, x1])
+        x1 = self._dense_layer(x, training=training, kernel=kernel)
+        x = self.concat([x, x1])
         return x
 
 
@@ -125,22 +407,56 @@ class DenseNetTransitionBlock(layers.Layer):
         epsilon:              (float): Small float added to variance to avoid dividing by zero in
                     batch normalisation, default: 1.001e-5
         activation (keras Activation): activation applied after batch normalization, default: relu
+        fused                  (bool): whether to use the fused batch normalization kernel, default: True
+        data_format             (str): "channels_last" or "channels_first", default: keras image data format
+        synchronized           (bool): whether to synchronize the batch normalization statistics across
+                    replicas (not fused), default: False
         kwargs    (keyword arguments): the arguments for Convolution Layer
     """
 
-    def __init__(self, reduction, epsilon=1.001e-5, activation="relu", **kwargs):
+    def __init__(
+        self,
+        reduction,
+        epsilon=1.001e-5,
+        activation="relu",
+        fused=True,
+        data_format=None,
+        synchronized=False,
+        **kwargs
+    ):
         super().__init__()
         self.reduction = reduction
         self.epsilon = epsilon
         self.activation = activation
+        self.fused = fused
+        self.data_format = data_format
+        self.synchronized = synchronized
         self.kwargs = kwargs
 
-    def __call__(self, inputs):
+    def build(self, input_shape):
+        channel_axis = get_channel_axis(self.data_format)
+        self.bn = get_batch_normalization(
+            axis=channel_axis,
+            epsilon=self.epsilon,
+            fused=self.fused,
+            synchronized=self.synchronized,
+        )
+        self.act = activations.get(self.activation)
+        self.conv = layers.Conv2D(
+            int(input_shape[channel_axis] * self.reduction),
+            1,
+            data_format=self.data_format,
+            **self.kwargs
+        )
+        self.pool = layers.AveragePooling2D(2, strides=2, data_format=self.data_format)
+        super().build(input_shape)
+
+    def call(self, inputs):
         x = inputs
-        x = layers.BatchNormalization(epsilon=self.epsilon)(x)
-        x = layers.Activation(self.activation)(x)
-        x = layers.Conv2D(int(x.shape[-1] * self.reduction), 1, **self.kwargs)(x)
-        x = layers.AveragePooling2D(2, strides=2)(x)
+        x = self.bn(x)
+        x = self.act(x)
+        x = self.conv(x)
+        x = self.pool(x)
         return x
 
 
@@ -197,6 +513,9 @@ class VGGModule(layers.Layer):
         pool_size           (int/tuple of two ints): window size over which to take the maximum, default: 2
         pool_stride         (int/tuple of two ints): specifies how far the pooling window moves for each pooling step,
                 default: 2
+        fused               (bool): whether to use the fused Batch Normalization kernel, default: True
+        synchronized        (bool): whether to synchronize the Batch Normalization statistics across replicas
+                (not fused), default: False
         kwargs              (keyword arguments): the arguments for Convolution Layer
     """
 
@@ -209,6 +528,8 @@ class VGGModule(layers.Layer):
         dropout=0,
         pool_size=2,
         pool_stride=2,
+        fused=True,
+        synchronized=False,
         **kwargs
     ):
         super().__init__()
@@ -219,20 +540,34 @@ class VGGModule(layers.Layer):
         self.dropout = dropout
         self.pool_size = pool_size
         self.pool_stride = pool_stride
+        self.fused = fused
+        self.synchronized = synchronized
         self.kwargs = kwargs
 
-    def __call__(self, inputs):
-        x = inputs
-        for i in range(self.num_conv):
-            x = Convolution2D(
+    def build(self, input_shape):
+        self.convs = [
+            Convolution2D(
                 self.num_filters,
                 self.kernel_size,
                 self.batch_normalization,
                 self.dropout,
+                fused=self.fused,
+                synchronized=self.synchronized,
                 padding="same",
                 **self.kwargs
-            )(x)
-        x = layers.MaxPooling2D(pool_size=self.pool_size, strides=self.pool_stride)(x)
+            )
+            for i in range(self.num_conv)
+        ]
+        self.pool = layers.MaxPooling2D(
+            pool_size=self.pool_size, strides=self.pool_stride
+        )
+        super().build(input_shape)
+
+    def call(self, inputs):
+        x = inputs
+        for conv in self.convs:
+            x = conv(x)
+        x = self.pool(x)
         return x
 
 
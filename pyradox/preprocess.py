@@ -0,0 +1,73 @@
+import numpy as np
+import tensorflow as tf
+from pyradox._kernels import normalize_batch as _normalize_batch
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    # parallel and releasing the GIL, compiled once and cached on disk
+    _normalize_batch_kernel = njit(parallel=True, nogil=True, cache=True)(
+        _normalize_batch
+    )
+else:
+    try:
+        # compiled ahead of time by setup.py, serial and holding the GIL (pycc supports
+        # neither parallel nor nogil), only used when numba is not installed at runtime
+        from pyradox.pyradox_kernels import normalize_batch as _normalize_batch_kernel
+    except ImportError:
+
+        def _normalize_batch_kernel(x, mean, std):
+            return (x - mean) / std
+
+
+def normalize_batch(x, mean, std):
+    """Normalizes a batch of images: `x_out = (x_in - mean) / std`, compiled with numba
+    (parallel over the batch) when it is installed, otherwise the kernel compiled ahead of
+    time at installation is used if it was built, vectorized with numpy as a last resort
+
+    Args:
+        x     (numpy array): 4D array with shape (batch_shape, rows, cols, channels)
+        mean (float / list): per channel mean
+        std  (float / list): per channel standard deviation
+    """
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    channels = x.shape[-1]
+    mean = np.ascontiguousarray(np.broadcast_to(np.float32(mean), (channels,)))
+    std = np.ascontiguousarray(np.broadcast_to(np.float32(std), (channels,)))
+    return _normalize_batch_kernel(x, mean, std)
+
+
+def normalize(x, mean, std):
+    """Applies `normalize_batch` to a tensor, for use within a `tf.data` pipeline
+
+    Args:
+        x          (tensor): 4D tensor with shape (batch_shape, rows, cols, channels)
+        mean (float / list): per channel mean
+        std  (float / list): per channel standard deviation
+    """
+    out = tf.numpy_function(
+        lambda batch: normalize_batch(batch, mean, std), [x], tf.float32
+    )
+    out.set_shape(x.shape)
+    return out
+
+
+def normalize_dataset(dataset, mean, std):
+    """Normalizes the images of a batched `tf.data.Dataset` of images or (images, ...) tuples,
+    the batches are processed in parallel
+
+    Args:
+        dataset (tf.data.Dataset): batched dataset
+        mean        (float / list): per channel mean
+        std         (float / list): per channel standard deviation
+    """
+
+    def _map(x, *rest):
+        if rest:
+            return (normalize(x, mean, std),) + rest
+        return normalize(x, mean, std)
+
+    return dataset.map(_map, num_parallel_calls=tf.data.AUTOTUNE)
@@ -1,8 +1,23 @@
+import os
+import sys
 import setuptools
 
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
+# the PEP 517 backend does not put the source tree on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ext_modules = []
+try:
+    from pyradox._kernels import get_extension
+
+    ext_modules.append(get_extension())
+except Exception as e:
+    # numba (numba.pycc) is unavailable or can not configure the extension, the kernels
+    # are jit compiled at runtime when numba is installed
+    print("pyradox: not building the ahead of time compiled kernels (%s)" % e)
+
 setuptools.setup(
     name="pyradox",
     version="0.17.10",
@@ -15,10 +30,13 @@ setuptools.setup(
     packages=setuptools.find_packages(
         exclude=[".git", ".idea", ".gitattributes", ".gitignore", ".github"]
     ),
-    install_requires=["Keras>=2.3.1", "numpy>=1.18.1", "tensorflow>=2.2.0"],
+    install_requires=["Keras>=2.3.1", "numpy>=1.18.1", "tensorflow>=2.12,<2.16"],
+    extras_require={"numba": ["numba>=0.49.0"]},
+    package_data={"pyradox": ["*.tflite", "*.so"]},
+    ext_modules=ext_modules,
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-)
\ No newline at end of file
+)
@@ -0,0 +1,8 @@
+import tensorflow as tf
+
+# two logical CPU devices for the distributed tests, they have to be configured before the
+# runtime is initialized
+tf.config.set_logical_device_configuration(
+    tf.config.list_physical_devices("CPU")[0],
+    [tf.config.LogicalDeviceConfiguration(), tf.config.LogicalDeviceConfiguration()],
+)
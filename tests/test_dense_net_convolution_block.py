@@ -1,7 +1,5 @@
-import sys, os
-
-sys.path.append(os.path.dirname(os.getcwd()))
-
+import pytest
+import tensorflow as tf
 from tensorflow import keras
 import numpy as np
 from pyradox import modules
@@ -18,3 +16,95 @@ def test():
     outputs = keras.layers.Dense(10, activation="softmax")(x)
 
     model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_einsum_bottleneck():
+    x = np.random.rand(2, 8, 8, 16).astype("float32")
+    conv_block = modules.DenseNetConvolutionBlock(growth_rate=8, use_bias=True)
+    einsum_block = modules.DenseNetConvolutionBlock(
+        growth_rate=8, use_bias=True, einsum_bottleneck=True
+    )
+    conv_block(x)
+    einsum_block(x)
+    assert isinstance(einsum_block.conv1, keras.layers.EinsumDense)
+
+    kernel, bias = conv_block.conv1.get_weights()
+    einsum_block.conv1.set_weights([kernel.reshape(16, 32), bias])
+    einsum_block.conv2.set_weights(conv_block.conv2.get_weights())
+    np.testing.assert_allclose(einsum_block(x), conv_block(x), rtol=1e-4, atol=1e-4)
+
+
+def test_freeze_for_inference():
+    x = np.random.rand(2, 8, 8, 16).astype("float32")
+    for einsum_bottleneck in [False, True]:
+        block = modules.DenseNetConvolutionBlock(
+            growth_rate=8, einsum_bottleneck=einsum_bottleneck
+        )
+        block(x, training=True)
+        block.bn2.moving_mean.assign(np.random.rand(32))
+        block.bn2.moving_variance.assign(np.random.rand(32) + 0.5)
+        expected = block(x, training=False)
+        block.freeze_for_inference()
+        assert block.bn2 is None
+        np.testing.assert_allclose(block(x), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_einsum_bottleneck_kwargs():
+    x = np.random.rand(2, 8, 8, 16).astype("float32")
+    block = modules.DenseNetConvolutionBlock(
+        growth_rate=8,
+        einsum_bottleneck=True,
+        dilation_rate=2,
+        kernel_regularizer="l2",
+    )
+    assert block(x).shape == (2, 8, 8, 24)
+    assert block.conv2.dilation_rate == (2, 2)
+    assert block.conv1.kernel_regularizer is not None
+    with pytest.raises(ValueError):
+        modules.DenseNetConvolutionBlock(
+            growth_rate=8, einsum_bottleneck=True, strides=2
+        )
+
+
+def test_grouped_kernel():
+    x = np.random.rand(2, 8, 8, 16).astype("float32")
+    kernel = np.random.rand(3, 3, 32, 8).astype("float32")
+    block = modules.DenseNetConvolutionBlock(growth_rate=8, grouped_kernel=True)
+    assert block(x, kernel=kernel).shape == (2, 8, 8, 24)
+    for kwargs in [{"use_bias": True}, {"kernel_regularizer": "l2"}]:
+        with pytest.raises(ValueError):
+            modules.DenseNetConvolutionBlock(
+                growth_rate=8, grouped_kernel=True, **kwargs
+            )
+
+
+def test_efficient_moving_statistics():
+    features = [np.random.rand(4, 8, 8, 8).astype("float32") for _ in range(2)]
+    block = modules.DenseNetConvolutionBlock(growth_rate=8)
+    efficient_block = modules.DenseNetConvolutionBlock(growth_rate=8, efficient=True)
+    block(np.concatenate(features, axis=-1))
+    efficient_block(features)
+    efficient_block.set_weights(block.get_weights())
+
+    @tf.function
+    def train_step(block, inputs):
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_sum(block(inputs, training=True))
+        return tape.gradient(loss, block.trainable_weights)
+
+    gradients = train_step(block, np.concatenate(features, axis=-1))
+    efficient_gradients = train_step(efficient_block, features)
+    for gradient, efficient_gradient in zip(gradients, efficient_gradients):
+        np.testing.assert_allclose(efficient_gradient, gradient, rtol=1e-4, atol=1e-4)
+    for batch_norm, efficient_batch_norm in [
+        (block.bn1, efficient_block.bn1),
+        (block.bn2, efficient_block.bn2),
+    ]:
+        np.testing.assert_allclose(
+            efficient_batch_norm.moving_mean, batch_norm.moving_mean, atol=1e-5
+        )
+        np.testing.assert_allclose(
+            efficient_batch_norm.moving_variance,
+            batch_norm.moving_variance,
+            atol=1e-5,
+        )
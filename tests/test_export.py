@@ -0,0 +1,120 @@
+import os
+import pytest
+import tensorflow as tf
+import numpy as np
+from tensorflow import keras
+from pyradox import export, convnets
+
+
+def tensorrt_available():
+    try:
+        from tensorflow.compiler.tf2tensorrt import _pywrap_py_utils
+    except ImportError:
+        return False
+    return (
+        _pywrap_py_utils.is_tensorrt_enabled()
+        and _pywrap_py_utils.get_loaded_tensorrt_version() != (0, 0, 0)
+        and len(tf.config.list_physical_devices("GPU")) > 0
+    )
+
+
+def representative_dataset():
+    for _ in range(4):
+        yield [np.random.rand(1, 28, 28, 1).astype("float32")]
+
+
+def test_to_int8():
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = keras.layers.Conv2D(8, 3)(inputs)
+    x = keras.layers.GlobalAvgPool2D()(x)
+    outputs = keras.layers.Dense(10)(x)
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+    tflite_model = export.to_int8(model, representative_dataset)
+    assert isinstance(tflite_model, bytes)
+
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    tensor_types = {
+        detail["dtype"]
+        for detail in interpreter.get_tensor_details()
+        if detail["name"].endswith("Conv2D")
+    }
+    assert np.int8 in tensor_types
+
+
+def test_freeze(tmp_path):
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = keras.layers.Conv2D(8, 3, use_bias=False)(inputs)
+    x = keras.layers.BatchNormalization()(x)
+    x = keras.layers.Activation("relu")(x)
+    x = keras.layers.GlobalAvgPool2D()(x)
+    outputs = keras.layers.Dense(10)(x)
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+    path = os.path.join(str(tmp_path), "model.pb")
+    graph_def = export.freeze(model, path)
+    assert os.path.exists(path)
+    ops = {node.op for node in graph_def.node}
+    assert "VarHandleOp" not in ops
+    assert "FusedBatchNormV3" not in ops
+
+
+@pytest.mark.skipif(
+    not tensorrt_available(), reason="requires a TF-TRT build and a GPU"
+)
+def test_to_trt(tmp_path):
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = keras.layers.Conv2D(8, 3)(inputs)
+    x = keras.layers.GlobalAvgPool2D()(x)
+    outputs = keras.layers.Dense(10)(x)
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+    x = tf.constant(np.random.rand(2, 28, 28, 1).astype("float32"))
+    output_dir = export.to_trt(
+        model, x, os.path.join(str(tmp_path), "trt"), precision_mode="FP32"
+    )
+    converted = tf.saved_model.load(output_dir)
+    outputs = converted.signatures["serving_default"](x)
+    np.testing.assert_allclose(
+        list(outputs.values())[0], model(x), rtol=1e-3, atol=1e-3
+    )
+
+
+def load_graph(graph_def, input_name, output_name):
+    def _import():
+        tf.compat.v1.import_graph_def(graph_def, name="")
+
+    function = tf.compat.v1.wrap_function(_import, [])
+    return function.prune(
+        function.graph.as_graph_element(input_name),
+        function.graph.as_graph_element(output_name),
+    )
+
+
+def test_freeze_dense_nets(tmp_path):
+    x = np.random.rand(2, 32, 32, 3).astype("float32")
+    for kwargs in [{}, {"efficient": True}, {"jit_compile": True}]:
+        inputs = keras.Input(shape=(32, 32, 3))
+        outputs = convnets.GeneralizedDenseNets([2, 2], **kwargs)(inputs)
+        model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+        graph_def = export.freeze(model, os.path.join(str(tmp_path), "model.pb"))
+        assert "VarHandleOp" not in {node.op for node in graph_def.node}
+        frozen = load_graph(graph_def, "x:0", "Identity:0")
+        np.testing.assert_allclose(
+            frozen(tf.constant(x)), model(x), rtol=1e-4, atol=1e-4
+        )
+
+
+def test_freeze_generalized_vgg(tmp_path):
+    x = np.random.rand(2, 16, 16, 3).astype("float32")
+    inputs = keras.Input(shape=(16, 16, 3))
+    outputs = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (1, 16)], dense_config=[32], conv_batch_norm=True
+    )(inputs)
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+    graph_def = export.freeze(model, os.path.join(str(tmp_path), "model.pb"))
+    frozen = load_graph(graph_def, "x:0", "Identity:0")
+    np.testing.assert_allclose(frozen(tf.constant(x)), model(x), rtol=1e-4, atol=1e-4)
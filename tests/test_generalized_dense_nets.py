@@ -1,7 +1,5 @@
-import sys, os
-
-sys.path.append(os.path.dirname(os.getcwd()))
-
+import pytest
+import tensorflow as tf
 from tensorflow import keras
 import numpy as np
 from pyradox import convnets
@@ -14,3 +12,233 @@ def test():
     outputs = keras.layers.Dense(10, activation="softmax")(x)
 
     model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_reuse():
+    dense_net = convnets.GeneralizedDenseNets([2, 2], use_bias=True)
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = dense_net(inputs)
+    num_weights = len(dense_net.weights)
+    x = dense_net(inputs)
+    assert len(dense_net.weights) == num_weights
+
+
+def test_fused_batch_norm():
+    dense_net = convnets.GeneralizedDenseNets([2, 2])
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = dense_net(inputs)
+    batch_norms = [
+        layer
+        for layer in dense_net.submodules
+        if isinstance(layer, keras.layers.BatchNormalization)
+    ]
+    assert len(batch_norms) > 0
+    assert all(layer.fused for layer in batch_norms)
+
+
+def test_channels_first():
+    inputs = keras.Input(shape=(1, 28, 28))
+    x = convnets.GeneralizedDenseNets([2, 2], data_format="channels_first")(inputs)
+    x = keras.layers.GlobalAvgPool2D(data_format="channels_first")(x)
+    outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_efficient():
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = convnets.GeneralizedDenseNets([2, 2], efficient=True)(inputs)
+    x = keras.layers.GlobalAvgPool2D()(x)
+    outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+    model.compile(loss="categorical_crossentropy", optimizer="adam")
+    model.fit(
+        np.random.rand(4, 28, 28, 1),
+        keras.utils.to_categorical(np.arange(4), 10),
+        epochs=1,
+        verbose=0,
+    )
+
+
+def test_mixed_precision():
+    keras.mixed_precision.set_global_policy("mixed_bfloat16")
+    try:
+        inputs = keras.Input(shape=(28, 28, 1))
+        x = convnets.GeneralizedDenseNets([2, 2])(inputs)
+        assert x.dtype == "float32"
+        x = keras.layers.GlobalAvgPool2D()(x)
+        outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+        model = keras.models.Model(inputs=inputs, outputs=outputs)
+    finally:
+        keras.mixed_precision.set_global_policy("float32")
+
+
+def test_jit_compile():
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = convnets.GeneralizedDenseNets([2, 2], jit_compile=True)(inputs)
+    x = keras.layers.GlobalAvgPool2D()(x)
+    outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+    model.compile(loss="categorical_crossentropy", optimizer="adam")
+    model.fit(
+        np.random.rand(4, 28, 28, 1),
+        keras.utils.to_categorical(np.arange(4), 10),
+        epochs=1,
+        verbose=0,
+    )
+
+
+def test_build_distributed():
+    dense_net = convnets.GeneralizedDenseNets.build_distributed([2, 2])
+    with dense_net.strategy.scope():
+        inputs = keras.Input(shape=(28, 28, 1))
+        x = dense_net(inputs)
+        x = keras.layers.GlobalAvgPool2D()(x)
+        outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+        model = keras.models.Model(inputs=inputs, outputs=outputs)
+        model.compile(loss="categorical_crossentropy", optimizer="adam")
+    model.fit(
+        np.random.rand(4, 28, 28, 1),
+        keras.utils.to_categorical(np.arange(4), 10),
+        epochs=1,
+        verbose=0,
+    )
+
+
+def test_build_distributed_replicas():
+    strategy = tf.distribute.MirroredStrategy(["/cpu:0", "/cpu:1"])
+    assert strategy.num_replicas_in_sync == 2
+    dense_net = convnets.GeneralizedDenseNets.build_distributed(
+        [2, 2], strategy=strategy
+    )
+    with strategy.scope():
+        inputs = keras.Input(shape=(28, 28, 1))
+        x = dense_net(inputs)
+        x = keras.layers.GlobalAvgPool2D()(x)
+        outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+        model = keras.models.Model(inputs=inputs, outputs=outputs)
+        model.compile(loss="categorical_crossentropy", optimizer="adam")
+    model.fit(
+        np.random.rand(4, 28, 28, 1),
+        keras.utils.to_categorical(np.arange(4), 10),
+        epochs=1,
+        verbose=0,
+    )
+    with pytest.raises(ValueError):
+        convnets.GeneralizedDenseNets.build_distributed(
+            [2, 2], strategy=strategy, jit_compile=True
+        )
+
+
+def test_sublayers():
+    dense_net = convnets.DenselyConnectedConvolutionalNetwork201()
+    assert [len(dense_block) for dense_block in dense_net.dense_blocks] == [
+        6,
+        12,
+        48,
+        32,
+    ]
+    assert len(dense_net.transitions) == 4
+
+
+def test_no_activation_layers():
+    dense_net = convnets.GeneralizedDenseNets([2, 2])
+    dense_net(np.random.rand(1, 64, 64, 3).astype("float32"))
+    assert not any(
+        isinstance(layer, keras.layers.Activation)
+        for layer in dense_net._flatten_layers()
+    )
+
+
+def test_to_int8():
+    dense_net = convnets.GeneralizedDenseNets([2, 2])
+    tflite_model = dense_net.to_int8(
+        lambda: ([np.random.rand(1, 32, 32, 3).astype("float32")] for _ in range(4)),
+        input_shape=(32, 32, 3),
+    )
+    assert isinstance(tflite_model, bytes)
+
+
+def test_stem_padding():
+    dense_net = convnets.GeneralizedDenseNets([2, 2])
+    x = dense_net(np.random.rand(1, 224, 224, 3).astype("float32"))
+    assert x.shape == (1, 14, 14, dense_net.transitions[-1].conv.filters)
+    assert not any(
+        isinstance(layer, keras.layers.ZeroPadding2D)
+        for layer in dense_net._flatten_layers()
+    )
+    assert dense_net.pool1.padding == "same"
+
+    # "same" pads the even sized stem inputs asymmetrically, (2, 3) around the 224px
+    # convolution input and (0, 1) around the 112px pooling input, unlike the symmetric
+    # (3, 3) / (1, 1) zero padding of the original DenseNet stem
+    inputs = tf.constant(np.random.rand(1, 224, 224, 3).astype("float32"))
+    y = dense_net.conv1(inputs)
+    expected = tf.nn.conv2d(
+        tf.pad(inputs, [[0, 0], [2, 3], [2, 3], [0, 0]]),
+        dense_net.conv1.kernel,
+        2,
+        "VALID",
+    )
+    np.testing.assert_allclose(y, expected, rtol=1e-4, atol=1e-4)
+    expected = tf.nn.max_pool2d(
+        tf.pad(y, [[0, 0], [0, 1], [0, 1], [0, 0]], constant_values=-np.inf),
+        3,
+        2,
+        "VALID",
+    )
+    np.testing.assert_allclose(dense_net.pool1(y), expected)
+
+
+def test_freeze_for_inference():
+    x = np.random.rand(2, 32, 32, 3).astype("float32")
+    dense_net = convnets.GeneralizedDenseNets([2, 2])
+    inputs = keras.Input(shape=(32, 32, 3))
+    model = keras.models.Model(inputs=inputs, outputs=dense_net(inputs))
+    model.compile(loss="mse", optimizer="adam")
+    model.fit(x, np.random.rand(2, 2, 2, 64), epochs=2, verbose=0)
+    expected = dense_net(x, training=False)
+    num_batch_norms = len(
+        [
+            layer
+            for layer in dense_net._flatten_layers()
+            if isinstance(layer, keras.layers.BatchNormalization)
+        ]
+    )
+
+    dense_net.freeze_for_inference(x)
+    assert dense_net.bn1 is None
+    assert (
+        len(
+            [
+                layer
+                for layer in dense_net._flatten_layers()
+                if isinstance(layer, keras.layers.BatchNormalization)
+            ]
+        )
+        == num_batch_norms - 5
+    )
+    np.testing.assert_allclose(dense_net(x), expected, rtol=1e-3, atol=1e-3)
+
+
+def test_grouped_kernels():
+    x = np.random.rand(2, 32, 32, 3).astype("float32")
+    dense_net = convnets.GeneralizedDenseNets([2, 3], grouped_kernels=True)
+    with tf.GradientTape() as tape:
+        loss = tf.reduce_sum(dense_net(x, training=True))
+    gradients = tape.gradient(loss, dense_net.stage_kernels)
+    assert [kernels.shape for kernels in dense_net.stage_kernels] == [
+        (2, 3, 3, 128, 32),
+        (3, 3, 3, 128, 32),
+    ]
+    assert all(gradient is not None for gradient in gradients)
+    assert not np.allclose(dense_net.stage_kernels[0][0], dense_net.stage_kernels[0][1])
+    assert not any(
+        isinstance(layer, keras.layers.Conv2D) and layer.kernel_size == (3, 3)
+        for layer in dense_net._flatten_layers()
+    )
@@ -1,7 +1,3 @@
-import sys, os
-
-sys.path.append(os.path.dirname(os.getcwd()))
-
 from tensorflow import keras
 import numpy as np
 from pyradox import convnets
@@ -34,3 +30,102 @@ def test_2():
     outputs = keras.layers.Dense(10, activation="softmax")(x)
 
     model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_reuse():
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(2, 32), (2, 64)],
+        dense_config=[28],
+        conv_batch_norm=True,
+    )
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = vgg(inputs)
+    num_weights = len(vgg.weights)
+    x = vgg(inputs)
+    assert len(vgg.weights) == num_weights
+
+
+def test_jit_compile():
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = convnets.GeneralizedVGG(
+        conv_config=[(2, 32), (2, 64)],
+        dense_config=[28],
+        conv_batch_norm=True,
+        conv_dropout=0.2,
+        jit_compile=True,
+    )(inputs)
+    outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+    model = keras.models.Model(inputs=inputs, outputs=outputs)
+    model.compile(loss="categorical_crossentropy", optimizer="adam")
+    model.fit(
+        np.random.rand(4, 28, 28, 1),
+        keras.utils.to_categorical(np.arange(4), 10),
+        epochs=1,
+        verbose=0,
+    )
+
+
+def test_jit_compile_input_shapes():
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(2, 32), (2, 64)],
+        dense_config=[],
+        jit_compile=True,
+    )
+    for size in [28, 32, 28]:
+        x = vgg(np.random.rand(2, size, size, 1).astype("float32"))
+        assert x.shape == (2, size // 4, size // 4, 64)
+    assert len(vgg._concrete) == 2
+
+
+def test_jit_compile_classifier():
+    x = np.random.rand(2, 16, 16, 3).astype("float32")
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (1, 16)],
+        dense_config=[32, 32],
+    )
+    compiled_vgg = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (1, 16)],
+        dense_config=[32, 32],
+        jit_compile=True,
+    )
+    vgg(x)
+    compiled_vgg(x)
+    compiled_vgg.set_weights(vgg.get_weights())
+    np.testing.assert_allclose(compiled_vgg(x), vgg(x), rtol=1e-4, atol=1e-4)
+
+
+def test_to_int8():
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (1, 16)],
+        dense_config=[32],
+    )
+    tflite_model = vgg.to_int8(
+        lambda: ([np.random.rand(1, 16, 16, 3).astype("float32")] for _ in range(4)),
+        input_shape=(16, 16, 3),
+    )
+    assert isinstance(tflite_model, bytes)
+
+
+def test_conv_config_arrays():
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (2, 16)],
+        dense_config=[],
+    )
+    assert vgg.num_conv.tolist() == [1, 2]
+    assert vgg.num_filters.tolist() == [8, 16]
+    vgg(np.random.rand(1, 16, 16, 3).astype("float32"))
+    assert [len(vgg_module.convs) for vgg_module in vgg.vgg_modules] == [1, 2]
+
+
+def test_sublayers():
+    vgg = convnets.GeneralizedVGG(
+        conv_config=[(1, 8), (2, 16)],
+        dense_config=[32, 32],
+    )
+    assert len(vgg.vgg_modules) == 2
+    assert [dense_layer.units for dense_layer in vgg.dense_layers] == [32, 32]
+    dense_layers = list(vgg.dense_layers)
+    for _ in range(2):
+        vgg(np.random.rand(1, 16, 16, 3).astype("float32"))
+    assert vgg.dense_layers == dense_layers
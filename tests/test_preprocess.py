@@ -0,0 +1,22 @@
+import tensorflow as tf
+import numpy as np
+from pyradox import preprocess
+
+
+def test_normalize_batch():
+    x = np.random.rand(4, 28, 28, 3).astype("float32") * 255
+    mean = [120.0, 115.0, 100.0]
+    std = [60.0, 55.0, 50.0]
+    x_out = preprocess.normalize_batch(x, mean, std)
+    assert x_out.dtype == np.float32
+    assert np.allclose(x_out, (x - np.float32(mean)) / np.float32(std), atol=1e-5)
+
+
+def test_normalize_dataset():
+    x = np.random.rand(8, 28, 28, 1).astype("float32") * 255
+    y = np.arange(8)
+    dataset = tf.data.Dataset.from_tensor_slices((x, y)).batch(4)
+    dataset = preprocess.normalize_dataset(dataset, 0.0, 255.0)
+    for x_out, y_out in dataset:
+        assert x_out.shape == (4, 28, 28, 1)
+        assert np.max(x_out) <= 1
@@ -1,7 +1,3 @@
-import sys, os
-
-sys.path.append(os.path.dirname(os.getcwd()))
-
 from tensorflow import keras
 import numpy as np
 from pyradox import modules
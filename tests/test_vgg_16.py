@@ -1,7 +1,3 @@
-import sys, os
-
-sys.path.append(os.path.dirname(os.getcwd()))
-
 from tensorflow import keras
 import numpy as np
 from pyradox import convnets
@@ -34,3 +30,13 @@ def test_2():
     outputs = keras.layers.Dense(10, activation="softmax")(x)
 
     model = keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_build_distributed():
+    vgg = convnets.VGG16.build_distributed(conv_batch_norm=True, dense_batch_norm=True)
+    with vgg.strategy.scope():
+        inputs = keras.Input(shape=(32, 32, 3))
+        x = vgg(inputs)
+        outputs = keras.layers.Dense(10, activation="softmax")(x)
+
+        model = keras.models.Model(inputs=inputs, outputs=outputs)